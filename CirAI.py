@@ -1,10 +1,8 @@
 import streamlit as st
 import streamlit.components.v1 as components
-import google.generativeai as genai
 from PIL import Image
-from streamlit_paste_button import paste_image_button
-from streamlit_drawable_canvas import st_canvas
 import json
+import orjson
 import re
 import base64
 import os
@@ -17,8 +15,9 @@ import datetime
 from streamlit_oauth import OAuth2Component
 import jwt
 import copy
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 
-GOOGLE_API_KEY = st.secrets["GOOGLE_API_KEY"]
 CLIENT_ID = st.secrets["GOOGLE_CLIENT_ID"]
 CLIENT_SECRET = st.secrets["GOOGLE_CLIENT_SECRET"]
 REDIRECT_URI = st.secrets.get("REDIRECT_URI", "https://829w23be5rbdxam99fd4do.streamlit.app")
@@ -30,19 +29,48 @@ oauth2 = OAuth2Component(
     "https://oauth2.googleapis.com/token", 
     "https://oauth2.googleapis.com/revoke"
 )
-genai.configure(api_key=GOOGLE_API_KEY)
 electrical_advisor_flag = 0
 derivation_steps_flag = 0
 img, topology, analysis_request, circuit_uses = None, None, None, None
 performance_advice, power_advice, noise_advice, component_advice, Recommended_articles_links = None, None, None, None, None
-model = genai.GenerativeModel('gemini-2.5-pro')
+MODEL_NAME = 'gemini-2.5-pro'
+
+# The Gemini SDK is heavy to import, so it is only loaded on the first model call
+@st.cache_resource(show_spinner=False)
+def get_genai():
+    """Import and configure the Gemini SDK once per process"""
+    import google.generativeai as genai
+    genai.configure(api_key=st.secrets["GOOGLE_API_KEY"])
+    return genai
+
+@st.cache_resource(show_spinner=False)
+def get_model(system_instruction=None):
+    """Build a model once per process (per system instruction)"""
+    return get_genai().GenerativeModel(MODEL_NAME, system_instruction=system_instruction)
+
+# Largest image side sent to the model; bigger images are downscaled first
+MODEL_IMAGE_MAX_SIZE = (1024, 1024)
+# Uploads up to this size are sent to the model as-is, without decoding and re-encoding
+MODEL_IMAGE_MAX_BYTES = 1024 * 1024
+# Control characters (C0, DEL and C1) stripped from model JSON before decoding
+_CTRL_TABLE = dict.fromkeys([*range(0x00, 0x20), *range(0x7f, 0xa0)])
+# Strips LaTeX subscript syntax from a parameter name (R_{1} -> R1) in a single pass
+_LATEX_NAME_TABLE = str.maketrans('', '', '_{}')
+_TOPOLOGY_RE = re.compile(r'"topology"\s*:\s*"([^"]*)"')
+
+# The static templates are immutable strings, so cache_resource hands out the one shared
+# copy instead of cache_data unpickling a fresh ~100KB copy on every call.
+# A missing file raises, and exceptions aren't cached, so it is retried on the next rerun.
+@st.cache_resource
+def _read_static_file(filename):
+    file_path = os.path.join('static', filename)
+    with open(file_path, 'r', encoding='utf-8') as f:
+        return f.read()
 
 def load_static_file(filename):
     """Load content from static file"""
-    file_path = os.path.join('static', filename)
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            return f.read()
+        return _read_static_file(filename)
     except FileNotFoundError:
         st.error(f"Static file not found: {filename}")
         return ""
@@ -51,23 +79,26 @@ def encode_css_base64(css_content):
     """Encode CSS content as base64 for inline embedding"""
     return base64.b64encode(css_content.encode('utf-8')).decode('utf-8')
 
+@st.cache_resource
+def _get_calculator_template():
+    """Load the calculator template with the base64 CSS and JS already inlined"""
+    html_template = _read_static_file('desmos_calculator.html')
+    css_content = _read_static_file('calculator.css')
+    js_content = _read_static_file('desmos_calculator.js')
+    # Replace template placeholders using string replacement (safer than .format())
+    html_template = html_template.replace('{css_base64}', encode_css_base64(css_content))
+    return html_template.replace('{calculator_js}', js_content)
+
 def generate_calculator_html(z_latex, params=[]):
     """Generate the calculator HTML using templates"""
-    # Load static files
-    html_template = load_static_file('desmos_calculator.html')
-    css_content = load_static_file('calculator.css')
-    js_content = load_static_file('desmos_calculator.js')
-    
-    if not all([html_template, css_content, js_content]):
+    try:
+        html_template = _get_calculator_template()
+    except FileNotFoundError as e:
+        st.error(f"Static file not found: {os.path.basename(e.filename)}")
         return "<div>Error loading calculator resources</div>"
     
-    # Encode CSS for inline embedding
-    css_base64 = encode_css_base64(css_content)
-    
-    # Replace template placeholders using string replacement (safer than .format())
-    html_content = html_template.replace('{css_base64}', css_base64)
-    html_content = html_content.replace('{calculator_js}', js_content)
-    html_content = html_content.replace('{z_latex}', json.dumps(z_latex))
+    # Only the per-circuit placeholders are substituted on each render
+    html_content = html_template.replace('{z_latex}', json.dumps(z_latex))
     html_content = html_content.replace('{params}', json.dumps(params))
     
     return html_content
@@ -88,13 +119,22 @@ def open_editor_modal():
     st.info("💡 Draw your circuit here with plenty of space!")
     st.components.v1.html(circuit_diagram_html, height=700)
 
+def parse_json_response(raw):
+    """Extract and decode the JSON object from a model response, or None if it can't be parsed"""
+    start, end = raw.find('{'), raw.rfind('}')
+    if start != -1 and end > start:
+        try:
+            # Clean the JSON string to remove control characters
+            json_str = raw[start:end + 1].translate(_CTRL_TABLE)
+            return orjson.loads(json_str)
+        except json.JSONDecodeError as e:
+            print(f"JSON parsing error: {e}")
+            print(f"Raw response: {raw[:500]}...")
+    return None
+
 def electrical_advisor(image, topology, analysis_request, circuit_uses):
     prompt = """
     You are an expert Analog IC Design Engineer.
-    Input provided:
-        {"- An image of the schematic" if image else ""}
-        {"- Analysis request: " + analysis_request if image else ""}
-        {"- Circuit use cases: " + circuit_uses if circuit_uses else ""}
     Based on the provided circuit diagram and analysis request, provide detailed advice on how to optimize the circuit for the specified use cases.
     Consider factors such as performance, power consumption, noise, and component selection. Provide specific recommendations for improving the circuit design to better meet the requirements of the use cases.
     Output ONLY a valid JSON object:
@@ -108,30 +148,17 @@ def electrical_advisor(image, topology, analysis_request, circuit_uses):
     """
     content_inputs = [prompt]
     if image:
-        content_inputs.append(image)
+        content_inputs.append(resize_for_model(image))
     if analysis_request:
         content_inputs.append(f"Analysis Request:\n{analysis_request}")
     if circuit_uses:
         content_inputs.append(f"Circuit Use Cases:\n{circuit_uses}")   
-    response = model.generate_content(content_inputs)
-    text = response.text.replace("```json", "").replace("```", "").strip()
-    match = re.search(r'\{.*\}', response.text, re.DOTALL)
-    if match:
-        try:
-            # Clean the JSON string to remove control characters
-            json_str = match.group()
-            # Remove common problematic control characters
-            json_str = re.sub(r'[\x00-\x1f\x7f-\x9f]', '', json_str)
-            return json.loads(json_str)
-        except json.JSONDecodeError as e:
-            print(f"JSON parsing error: {e}")
-            print(f"Raw response: {response.text[:500]}...")
-            return None
-    return None 
+    response = get_model().generate_content(content_inputs)
+    return parse_json_response(response.text)
 
-def bug_detector(image, topology, formula, analysis_request, circuit_uses):
-    model = genai.GenerativeModel('gemini-2.5-pro')
-    prompt = """
+def bug_detector(model, image, topology, formula, analysis_request, circuit_uses):
+    """Runs on a worker thread, so the model is passed in from the script thread"""
+    prompt = f"""
     You are a strict Senior Analog VLSI Design Reviewer. 
     Analyze the provided schematic and circuit information to detect any architectural bugs, incorrect connections, or fundamental design flaws.
     
@@ -159,77 +186,86 @@ def bug_detector(image, topology, formula, analysis_request, circuit_uses):
     
     content_inputs = [prompt]
     if image:
-        content_inputs.append(image)
+        content_inputs.append(resize_for_model(image))
         
     response = model.generate_content(content_inputs)
-    text = response.text.replace("```json", "").replace("```", "").strip()
-    match = re.search(r'\{.*\}', text, re.DOTALL)
-    
-    if match:
-        try:
-            json_str = match.group()
-            json_str = re.sub(r'[\x00-\x1f\x7f-\x9f]', '', json_str)
-            return json.loads(json_str)
-        except json.JSONDecodeError as e:
-            print(f"JSON parsing error: {e}")
-            return None
-    return None
+    return parse_json_response(response.text)
 
-def analyze_circuit(image, netlist_text, analysis_request, derivation_steps_flag):
-    model = genai.GenerativeModel('gemini-2.5-pro')
-    prompt = """
-    You are an expert Analog IC Design Engineer.
-    Input provided:
-        {"- An image of the schematic" if image else ""}
-        {"- A SPICE netlist describing the connectivity" if netlist_text else ""}
-    Analyze the provided circuit diagram (circuit schematic image or netlist file) **based only on the user's request: "{analysis_request}"**. (can be Z(Vout), Vout/Vin, Vout/Vcc etc.).
-    Extract the symbolic formula for the given node or function.
-    Include all elements (R, L, C).
-    Include active elements (nmos, pmos etc.) model it by small signal model (current source, g_m and r_o).
-    Output ONLY a valid JSON object:
-    {
-      "topology": "Topology Name",
-      "H_latex_formula": "formula using s, R, C, L, g_m, r_o in regular LaTex format, The expression should be as simplified as possible. Do not use the || (parallel) symbol, but simplify the equation as much as possible. do not neglect any parameter. do not use in prohibited LaTex letters like: ',', ';' etc.",
-      "H_latex": "formula using s, R, C, L, g_m, r_o. use the Desmos calculator LaTex format only. for example: {5+a_{2}}/{s^{2}+\\\\pi*s-{1}/{5*s}}. use * for multiply, / for divition. any nominator or denominator, put in parentheses: '()'. the function name will be: Z(s) if it is impedance, H(s) if it is a transfer function."
-      "params": ["list of all the parameters that appear in the formula, for example: ['R1', 'C2', 'gm3', 'ro4']"]
-    }
-    """
+ANALYSIS_INSTRUCTIONS = """
+You are an expert Analog IC Design Engineer.
+Analyze the provided circuit diagram (circuit schematic image or netlist file) **based only on the user's request**. (can be Z(Vout), Vout/Vin, Vout/Vcc etc.).
+Extract the symbolic formula for the given node or function.
+Include all elements (R, L, C).
+Include active elements (nmos, pmos etc.) model it by small signal model (current source, g_m and r_o).
+Output ONLY a valid JSON object:
+{
+  "topology": "Topology Name",
+  "H_latex_formula": "formula using s, R, C, L, g_m, r_o in regular LaTex format, The expression should be as simplified as possible. Do not use the || (parallel) symbol, but simplify the equation as much as possible. do not neglect any parameter. do not use in prohibited LaTex letters like: ',', ';' etc.",
+  "H_latex": "formula using s, R, C, L, g_m, r_o. use the Desmos calculator LaTex format only. for example: {5+a_{2}}/{s^{2}+\\\\pi*s-{1}/{5*s}}. use * for multiply, / for divition. any nominator or denominator, put in parentheses: '()'. the function name will be: Z(s) if it is impedance, H(s) if it is a transfer function."
+  "params": ["list of all the parameters that appear in the formula, for example: ['R1', 'C2', 'gm3', 'ro4']"]
+}
+"""
+
+def _stream_analysis(image_blob, netlist_text, analysis_request, derivation_steps_flag, progress=None):
+    """Run the analysis prompt, streaming the response.
+    progress is an optional st.empty() placeholder updated while the response streams in."""
+    # Only the per-request part of the prompt is sent; the static part is the model's system instruction
+    prompt_parts = ["Input provided:"]
+    if image_blob:
+        prompt_parts.append("- An image of the schematic")
+    if netlist_text:
+        prompt_parts.append("- A SPICE netlist describing the connectivity")
+    prompt_parts.append(f'User\'s request: "{analysis_request}"')
     if derivation_steps_flag == 1:
-        prompt += """derivation_steps": "In addition to the above, provide a detailed step-by-step derivation of how you arrived at the final formula. Include all intermediate steps, assumptions, and simplifications made during the analysis. write it in LaTex format only."""
-    content_inputs = [prompt]
-    if image:
-        content_inputs.append(image)
+        prompt_parts.append('Also add a "derivation_steps" field: a detailed step-by-step derivation of how you arrived at the final formula. Include all intermediate steps, assumptions, and simplifications made during the analysis. write it in LaTex format only.')
+    content_inputs = ["\n".join(prompt_parts)]
+    if image_blob:
+        content_inputs.append(image_blob)
     if netlist_text:
         pass
         #content_inputs.append(f"Netlist Data:\n{netlist_text}")
-    if analysis_request:
-        content_inputs.append(f"Analysis Request:\n{analysis_request}")
-    response = model.generate_content(content_inputs)
-    text = response.text.replace("```json", "").replace("```", "").strip()
-    match = re.search(r'\{.*\}', response.text, re.DOTALL)
-    if match:
-        try:
-            # Clean the JSON string to remove control characters
-            json_str = match.group()
-            # Remove common problematic control characters
-            json_str = re.sub(r'[\x00-\x1f\x7f-\x9f]', '', json_str)
-            return json.loads(json_str)
-        except json.JSONDecodeError as e:
-            print(f"JSON parsing error: {e}")
-            print(f"Raw response: {response.text[:500]}...")
+    response = get_model(ANALYSIS_INSTRUCTIONS).generate_content(content_inputs, stream=True)
+    raw = ""
+    topology_shown = False
+    for chunk in response:
+        # The final chunk can carry only finish_reason/usage metadata; chunk.text raises on it
+        if not chunk.candidates or not chunk.candidates[0].content.parts:
+            continue
+        raw += chunk.text
+        if progress is not None and not topology_shown:
+            # Show the topology as soon as the model has emitted that field
+            topology_match = _TOPOLOGY_RE.search(raw)
+            if topology_match:
+                progress.success(f"**Topology:** {topology_match.group(1)}")
+                topology_shown = True
+    return parse_json_response(raw)
+
+def prepare_image_blob(image, image_blob=None):
+    """Return the image as a {"mime_type", "data"} blob for the model, and the SHA-256 digest of its bytes.
+    image_blob is the original upload when it is small enough to send directly."""
+    if image_blob is None and image:
+        image_blob = {"mime_type": "image/png", "data": image_to_png_bytes(resize_for_model(image))}
+    image_digest = hashlib.sha256(image_blob["data"]).hexdigest() if image_blob else None
+    return image_blob, image_digest
+
+def analyze_circuit(image_blob, image_digest, netlist_text, analysis_request, derivation_steps_flag, progress=None):
+    """Results are memoized per session on the image digest and text inputs."""
+    # Streaming updates the page, so the result is memoized here rather than with st.cache_data,
+    # which would replay the progress calls against a placeholder from an earlier run
+    cache_key = (image_digest, netlist_text, analysis_request, derivation_steps_flag)
+    analysis_cache = st.session_state.setdefault('analysis_cache', {})
+    if cache_key not in analysis_cache:
+        res = _stream_analysis(image_blob, netlist_text, analysis_request, derivation_steps_flag, progress)
+        if res is None:
+            # Failed parses aren't stored, so pressing the button again retries the model
             return None
-    return None
+        analysis_cache[cache_key] = res
+    # The result is edited in place later (live parameter values), so hand out a copy
+    return copy.deepcopy(analysis_cache[cache_key])
 
 def optimize_circuit(bounded_param_list, image, formula, analysis_request, circuit_uses):
-    model = genai.GenerativeModel('gemini-2.5-pro')
-    prompt = """
+    prompt = f"""
     You are an expert Analog IC Design Engineer.
-    Input provided:
-        {"- An image of the schematic" if image else ""}
-        {"- A symbolic formula for the circuit behavior: " + formula if formula else ""}
-        {"- Analysis request: " + analysis_request if analysis_request else ""}
-        {"- Circuit use cases: " + circuit_uses if circuit_uses else ""}
-        
     Based on the provided circuit diagram, symbolic formula, and analysis request, optimize the circuit design by tuning the following parameters within their specified bounds:
     {bounded_param_list}
     
@@ -249,26 +285,15 @@ def optimize_circuit(bounded_param_list, image, formula, analysis_request, circu
     """
     content_inputs = [prompt]
     if image:
-        content_inputs.append(image)
+        content_inputs.append(resize_for_model(image))
     if formula:
         content_inputs.append(f"Symbolic Formula:\n{formula}")
     if analysis_request:
         content_inputs.append(f"Analysis Request:\n{analysis_request}")
     if circuit_uses:
         content_inputs.append(f"Circuit Use Cases:\n{circuit_uses}")   
-    response = model.generate_content(content_inputs)
-    text = response.text.replace("```json", "").replace("```", "").strip()
-    match = re.search(r'\{.*\}', response.text, re.DOTALL)
-    if match:
-        try:
-            json_str = match.group()
-            json_str = re.sub(r'[\x00-\x1f\x7f-\x9f]', '', json_str)
-            return json.loads(json_str)
-        except json.JSONDecodeError as e:
-            print(f"JSON parsing error: {e}")
-            print(f"Raw response: {response.text[:500]}...")
-            return None
-    return None
+    response = get_model().generate_content(content_inputs)
+    return parse_json_response(response.text)
 
 def assign_param_bounds(param_list):
     bounds_config = {
@@ -338,12 +363,31 @@ def assign_param_bounds(param_list):
         })
     return result
 
+@st.cache_data(show_spinner=False)
+def load_model_image(file_bytes):
+    """Decode an uploaded image once, downscaled to the model's effective resolution"""
+    image = Image.open(BytesIO(file_bytes))
+    image.draft('RGB', MODEL_IMAGE_MAX_SIZE)
+    image.thumbnail(MODEL_IMAGE_MAX_SIZE, Image.LANCZOS)
+    return image
+
+def resize_for_model(image):
+    """Return a downscaled copy of images larger than the model's effective resolution"""
+    if image.width <= MODEL_IMAGE_MAX_SIZE[0] and image.height <= MODEL_IMAGE_MAX_SIZE[1]:
+        return image
+    image = image.copy()
+    image.thumbnail(MODEL_IMAGE_MAX_SIZE, Image.LANCZOS)
+    return image
+
+def image_to_png_bytes(img):
+    buffered = BytesIO()
+    img.save(buffered, format="PNG")
+    return buffered.getvalue()
+
 def image_to_base64(img):
     if img is None:
         return None
-    buffered = BytesIO()
-    img.save(buffered, format="PNG")
-    img_str = base64.b64encode(buffered.getvalue()).decode("utf-8")
+    img_str = base64.b64encode(image_to_png_bytes(img)).decode("utf-8")
     return img_str
 
 def base64_to_image(base64_str):
@@ -524,6 +568,7 @@ with col_in:
                         }
                     st.session_state['project_data'].update({
                         'img': img_obj,
+                        'img_digest': hashlib.sha256(img_data.encode()).hexdigest() if img_data else None,
                         'netlist_text': loaded_data.get("netlist_text", ""),
                         'analysis_request': loaded_data.get("analysis_request", ""),
                         'circuit_uses': loaded_data.get("circuit_uses", ""),
@@ -545,14 +590,21 @@ with col_in:
         horizontal=True
     )
     img = st.session_state['project_data'].get('img')
+    img_blob = None
     netlist_content = st.session_state['project_data'].get('netlist_text')
     if input_method == "🖼️ Upload / Paste":
         st.write("Upload or paste a circuit image:")
         uploaded_file = st.file_uploader("Upload circuit image", type=["png", "jpg", "jpeg"])
+        from streamlit_paste_button import paste_image_button
         paste_result = paste_image_button(label="📋 Paste here", errors="ignore")
         if uploaded_file:
-            img = Image.open(uploaded_file)
-            st.image(img, caption="Uploaded circuit", width=350)
+            raw_bytes = uploaded_file.getvalue()
+            # The original is kept (lazily decoded) for project export; model calls downscale it
+            img = Image.open(BytesIO(raw_bytes))
+            if len(raw_bytes) <= MODEL_IMAGE_MAX_BYTES:
+                img_blob = {"mime_type": uploaded_file.type, "data": raw_bytes}
+            # Decoded and downscaled once per file; reruns reuse the cached preview
+            st.image(load_model_image(raw_bytes), caption="Uploaded circuit", width=350)
         elif paste_result.image_data is not None:
             st.image(paste_result.image_data, caption="Pasted circuit", width=350)
             img = paste_result.image_data
@@ -665,6 +717,7 @@ with col_in:
 
             # 6. Render Canvas 
             # Here we ONLY pass initial_drawing. It won't update continuously, stopping the flicker loop!
+            from streamlit_drawable_canvas import st_canvas
             canvas_result = st_canvas(
                 fill_color="rgba(255, 165, 0, 0.3)",
                 stroke_width=stroke_width,
@@ -695,7 +748,8 @@ with col_in:
         if netlist_method == "Upload Netlist file":
             net_file = st.file_uploader("upload file .net or .sp or .txt", type=["net", "sp", "txt"])
             if net_file:
-                netlist_content = net_file.read().decode("utf-8")
+                # Decode straight from the upload buffer, without an intermediate bytes copy
+                netlist_content = str(net_file.getbuffer(), "utf-8")
         elif netlist_method == "Paste text":
             netlist_content = st.text_area("Paste here (SPICE format):", height=200)
     derivation_steps = st.radio("Derivation Steps:", ["None", "Show derivation steps in markdown format"])
@@ -709,7 +763,11 @@ with col_in:
                     st.session_state['project_data']['analysis_request'] = analysis_request
                     st.session_state['project_data']['img'] = img
                     st.session_state['project_data']['netlist_text'] = netlist_content
-                    res = analyze_circuit(img, netlist_content, analysis_request, derivation_steps_flag)
+                    image_blob, image_digest = prepare_image_blob(img, img_blob)
+                    st.session_state['project_data']['img_digest'] = image_digest
+                    progress = st.empty()
+                    res = analyze_circuit(image_blob, image_digest, netlist_content, analysis_request, derivation_steps_flag, progress)
+                    progress.empty()
                     st.session_state['project_data']['res'] = res
 
 with col_out:
@@ -745,27 +803,32 @@ with col_out:
             for i, original_name in enumerate(original_params):
                 if original_name in saved_params and str(saved_params[original_name]).strip() != "":
                     params[i]['value'] = str(saved_params[original_name]).strip()
-        with st.spinner("Running architecture & topology bug check..."):
-            topology = res.get('topology', '')
-            formula = res.get('H_latex_formula', '')
-            c_uses = st.session_state['project_data'].get('circuit_uses', '')
-            bug_res = bug_detector(img, topology, formula, analysis_request, c_uses)
-            st.session_state['project_data']['bug_res'] = bug_res
-        bug_res = st.session_state['project_data'].get('bug_res')
-        if bug_res and bug_res.get("bug_found", "No") == "Yes":
-            st.error("⚠️ **Architectural Flaw or Bug Detected!**")
-            with st.expander("🚨 View Bug Details & Suggested Fix", expanded=True):
-                severity_color = "red" if bug_res.get('severity') in ["High", "Critical"] else "orange" if bug_res.get('severity') == "Medium" else "green"
-                st.markdown(f"**Severity:** :{severity_color}[{bug_res.get('severity', 'N/A')}]")
-                st.markdown("**Bug Description:**")
-                st.write(bug_res.get('bug_description', 'N/A'))
-                st.markdown("**Suggested Fix:**")
-                st.write(bug_res.get('suggested_fix', 'N/A'))
+        topology = res.get('topology', '')
+        formula = res.get('H_latex_formula', '')
+        c_uses = st.session_state['project_data'].get('circuit_uses', '')
+        # The bug check runs in the background while the rest of the results render;
+        # its output is placed back at the top of the column once it completes.
+        # It is only resubmitted when the analysed inputs change (or the previous check failed),
+        # not on edits to the input widgets that haven't been analysed yet.
+        analysed_img = st.session_state['project_data'].get('img')
+        analysed_request = st.session_state['project_data'].get('analysis_request')
+        bug_key = (st.session_state['project_data'].get('img_digest'), topology, formula, analysed_request, c_uses)
+        bug_future = st.session_state.get('bug_future')
+        if st.session_state.get('bug_key') != bug_key or (bug_future.done() and bug_future.exception() is not None):
+            old_executor = st.session_state.get('bug_executor')
+            if old_executor is not None:
+                # Drop the stale check rather than queueing behind it; its thread exits once it returns
+                old_executor.shutdown(wait=False, cancel_futures=True)
+            st.session_state['bug_executor'] = ThreadPoolExecutor(max_workers=1)
+            bug_future = st.session_state['bug_executor'].submit(bug_detector, get_model(), analysed_img, topology, formula, analysed_request, c_uses)
+            st.session_state['bug_key'] = bug_key
+            st.session_state['bug_future'] = bug_future
+        bug_slot = st.container()
         opt_res = st.session_state['project_data'].get('opt_res')
         if opt_res:
                     opt_dict = opt_res.get("optimized_parameters", {})
                     for p in params:
-                        raw_name = p['name'].replace('_', '').replace('{', '').replace('}', '')
+                        raw_name = p['name'].translate(_LATEX_NAME_TABLE)
                         new_val = None
                         if p['name'] in opt_dict:
                             new_val = opt_dict[p['name']]
@@ -813,6 +876,19 @@ with col_out:
                 st.latex(r"\overline{V_n^2} = 4k_B T R \cdot \Delta f")
         calculator_html = generate_calculator_html(st.session_state['project_data']['res'].get('H_latex_formula', '0'), params)
         st.components.v1.html(calculator_html, height=600)
+        with bug_slot:
+            with st.spinner("Running architecture & topology bug check..."):
+                st.session_state['project_data']['bug_res'] = bug_future.result()
+            bug_res = st.session_state['project_data'].get('bug_res')
+            if bug_res and bug_res.get("bug_found", "No") == "Yes":
+                st.error("⚠️ **Architectural Flaw or Bug Detected!**")
+                with st.expander("🚨 View Bug Details & Suggested Fix", expanded=True):
+                    severity_color = "red" if bug_res.get('severity') in ["High", "Critical"] else "orange" if bug_res.get('severity') == "Medium" else "green"
+                    st.markdown(f"**Severity:** :{severity_color}[{bug_res.get('severity', 'N/A')}]")
+                    st.markdown("**Bug Description:**")
+                    st.write(bug_res.get('bug_description', 'N/A'))
+                    st.markdown("**Suggested Fix:**")
+                    st.write(bug_res.get('suggested_fix', 'N/A'))
         st.markdown("---")
         st.markdown(
             """
@@ -922,7 +998,7 @@ with st.sidebar:
         Keep your answers professional, highly technical, and concise. Use standard VLSI terminology.
         {current_context}
         """
-        chat_model = genai.GenerativeModel('gemini-2.5-pro',system_instruction=sys_prompt)
+        chat_model = get_genai().GenerativeModel(MODEL_NAME,system_instruction=sys_prompt)
         gemini_history = [
             {"role": "user" if msg["role"] == "user" else "model", "parts": [msg["content"]]} 
             for msg in st.session_state['chat_history']
@@ -933,7 +1009,7 @@ with st.sidebar:
                 try:
                     img_for_chat = st.session_state['project_data'].get('img')
                     if img_for_chat is not None and len(st.session_state['chat_history']) == 0:
-                        response = chat.send_message([prompt, img_for_chat])
+                        response = chat.send_message([prompt, resize_for_model(img_for_chat)])
                     else:
                          response = chat.send_message(prompt)
                     st.markdown(response.text)